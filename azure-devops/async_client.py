@@ -0,0 +1,164 @@
+"""
+Copyright start
+MIT License
+Copyright (c) 2024 Fortinet Inc
+Copyright end
+"""
+
+import asyncio
+import copy
+import importlib.util
+import threading
+from time import monotonic
+from connectors.core.connector import get_logger, ConnectorError
+from .constants import *
+from .utils import json_loads, get_deadline, get_request_timeout, raise_response_error
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = get_logger('azure-devops')
+
+ASYNC_CLIENT_AVAILABLE = httpx is not None
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+_loop_lock = threading.Lock()
+_loop = None
+# pooled async sessions, only used from the event loop thread
+_async_sessions = {}
+
+
+def get_event_loop():
+    """Return the event loop that runs all async requests of the process, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='azure-devops-async', daemon=True).start()
+        return _loop
+
+
+async def get_async_session(client):
+    # one session per configuration, replaced when its transport settings change
+    key = (client.server_url, client.config_id)
+    settings = (client.verify_ssl, client.max_concurrency)
+    entry = _async_sessions.get(key)
+    if entry is not None and entry[0] == settings:
+        return entry[1]
+    session = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE, verify=client.verify_ssl if client.verify_ssl is not None else True,
+        limits=httpx.Limits(max_connections=client.max_concurrency,
+                            max_keepalive_connections=client.max_concurrency))
+    _async_sessions[key] = (settings, session)
+    if entry is not None:
+        await entry[1].aclose()
+    logger.debug('Created pooled async HTTP session with {0} connections'.format(client.max_concurrency))
+    return session
+
+
+class AsyncAzureDevOps:
+    def __init__(self, client, session, deadline=None):
+        self.client = client
+        self.session = session
+        # requests of several actions share the event loop thread, so the deadline is passed explicitly
+        self.deadline = deadline
+
+    async def _send(self, method, url, retry=None, headers=None, **kwargs):
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        headers = dict(self.client.headers, **headers) if headers else self.client.headers
+        rate_limiter = self.client.rate_limiter
+        deadline = monotonic() + RETRY_TIME_BUDGET
+        attempt = 0
+        while True:
+            if rate_limiter:
+                wait = rate_limiter.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+            connect_timeout, read_timeout = get_request_timeout(self.client.connect_timeout, self.client.read_timeout,
+                                                                self.deadline)
+            response = await self.session.request(method, url, auth=self.client.auth, headers=headers,
+                                                  timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                                                  **kwargs)
+            if rate_limiter:
+                rate_limiter.update(response)
+            if not retry or attempt >= self.client.max_retries or response.status_code not in RETRY_STATUS_CODES:
+                return response
+            delay = self.client._get_retry_delay(response, attempt)
+            if monotonic() + delay > min(deadline, self.deadline or deadline):
+                logger.warning('Retry budget exhausted for url {0}'.format(url))
+                return response
+            attempt += 1
+            logger.warning('Received status {0} for url {1}, retry {2}/{3} in {4:.2f} seconds'.format(
+                response.status_code, url, attempt, self.client.max_retries, delay))
+            await asyncio.sleep(delay)
+
+    async def make_request(self, endpoint, method='GET', data=None, params=None, is_url=False, retry=None,
+                           use_cache=False):
+        try:
+            url = endpoint if is_url else self.client.server_url + endpoint
+            logger.info('Executing url {}'.format(url))
+            params = dict(params or {})
+            params['api-version'] = self.client.api_version
+            # CURL UTILS CODE
+            try:
+                from connectors.debug_utils.curl_script import make_curl
+                make_curl(method, url, headers=self.client.headers, params=params, data=data,
+                          verify_ssl=self.client.verify_ssl)
+            except Exception as err:
+                logger.debug(f"Error in curl utils: {str(err)}")
+
+            cache_key = None
+            cached_response = None
+            extra_headers = None
+            if use_cache and method.upper() == 'GET':
+                cache_key, cached_response, extra_headers = self.client._get_cached_response(url, params)
+            response = await self._send(method, url, retry=retry, params=params, content=data, headers=extra_headers)
+            if response.is_success or response.status_code == 304:
+                logger.info('successfully get response for url {}'.format(url))
+                if method.lower() == 'delete':
+                    return None
+                elif response.status_code == 304:
+                    return copy.deepcopy(cached_response[1]) if cached_response else None
+                elif response.status_code == 203:
+                    raise ConnectorError("Invalid Access Token for the given organization.")
+                result = json_loads(response.content)
+                if cache_key and response.headers.get('ETag'):
+                    self.client._set_cached_response(cache_key, response.headers['ETag'], result)
+                return result
+            raise_response_error(response.status_code, response.content, response.text, response.reason_phrase)
+        except ConnectorError:
+            raise
+        except httpx.ConnectTimeout:
+            raise ConnectorError('The request timed out while trying to connect to the server')
+        except httpx.ReadTimeout:
+            raise ConnectorError('The server did not send any data in the allotted amount of time')
+        except httpx.ConnectError as err:
+            if 'CERTIFICATE_VERIFY_FAILED' in str(err):
+                raise ConnectorError('SSL certificate validation failed')
+            raise ConnectorError('Invalid endpoint or credentials')
+        except Exception as err:
+            raise ConnectorError(str(err))
+
+    async def make_requests(self, requests_kwargs):
+        semaphore = asyncio.Semaphore(self.client.max_concurrency)
+
+        async def run(kwargs):
+            async with semaphore:
+                try:
+                    return await self.make_request(**kwargs)
+                except ConnectorError as err:
+                    return err
+
+        return await asyncio.gather(*[run(kwargs) for kwargs in requests_kwargs])
+
+
+def make_requests(client, requests_kwargs):
+    deadline = get_deadline()
+
+    async def run():
+        async_client = AsyncAzureDevOps(client, await get_async_session(client), deadline)
+        return await async_client.make_requests(requests_kwargs)
+    return asyncio.run_coroutine_threadsafe(run(), get_event_loop()).result()
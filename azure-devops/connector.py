@@ -6,7 +6,9 @@ Copyright end
 """
 
 from connectors.core.connector import Connector, get_logger, ConnectorError
-from .operations import operations, _check_health
+from .operations import operations, _check_health, reset_client_stats, get_client_stats
+from .microsoft_api_auth import normalize_expires_on
+from .utils import get_rate_limiter_stats, get_latency_stats, action_deadline, JSON_CODEC
 from connectors.core.utils import update_connnector_config
 
 
@@ -17,8 +19,13 @@ class Azure(Connector):
     def execute(self, config, operation, params, *args, **kwargs):
         try:
             logger.info('In execute() Operation: {}'.format(operation))
-            operation = operations.get(operation)
-            return operation(config, params)
+            action = operations.get(operation)
+            reset_client_stats()
+            with action_deadline(config):
+                result = action(config, params)
+            logger.debug('Operation {0} stats: {1}, rate limiters: {2}, hedging: {3}, json codec: {4}'.format(
+                operation, get_client_stats(), get_rate_limiter_stats(), get_latency_stats(), JSON_CODEC))
+            return result
         except Exception as err:
             logger.error('An exception occurred {}'.format(err))
             raise ConnectorError('{}'.format(err))
@@ -44,5 +51,7 @@ class Azure(Connector):
                 new_config['access_token'] = old_config.get('access_token')
                 new_config['refresh_token'] = old_config.get('refresh_token')
                 new_config['expiresOn'] = 0
+        if 'expiresOn' in new_config:
+            new_config['expiresOn'] = normalize_expires_on(new_config['expiresOn'])
         update_connnector_config(connector_info['connector_name'], connector_info['connector_version'], new_config,
                                  new_config['config_id'])
@@ -5,6 +5,8 @@ Copyright (c) 2024 Fortinet Inc
 Copyright end
 """
 
+import os
+import tempfile
 
 # redirect url
 DEFAULT_REDIRECT_URL = 'https://localhost/myapp'
@@ -13,6 +15,8 @@ AUTHORIZATION_CODE = 'authorization_code'
 REFRESH_TOKEN = 'refresh_token'
 API_VERSION = '7.1'
 CONFIG_SUPPORTS_TOKEN = True
+TOKEN_REFRESH_AHEAD = 300
+LEGACY_EXPIRY_FORMATS = ['%a %b %d %H:%M:%S %Y', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S']
 
 PROJECT_STATE_MAPPING = {
     "All": "all",
@@ -31,3 +35,130 @@ PR_STATUS_MAPPING = {
     "Completed": "completed",
     "Not Set": "notSet"
 }
+
+# connection pooling
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_CONNECTIONS = 4
+FINGERPRINT_KEYS = ['config_id', 'server_url', 'organization', 'auth_type', 'api_key', 'client_id', 'code',
+                    'verify_ssl', 'api_version']
+# every configuration field that changes how a client sends requests
+CLIENT_CONFIG_KEYS = FINGERPRINT_KEYS + ['pool_size', 'max_concurrency', 'max_retries', 'rate_limit', 'connect_timeout',
+                                         'read_timeout', 'action_timeout', 'hedge_requests', 'hedge_percentile']
+
+# pagination
+DEFAULT_PAGE_SIZE = 100
+CONTINUATION_TOKEN_HEADER = 'x-ms-continuationtoken'
+DEFAULT_MAX_CONCURRENCY = 4
+
+# branch ref cache
+BRANCH_REF_PREFIX = 'refs/heads/'
+REF_CACHE_SIZE = 256
+REF_CACHE_TTL = 300
+
+# identity cache
+IDENTITY_CACHE_SIZE = 1024
+IDENTITY_CACHE_TTL = 3600
+IDENTITY_NEGATIVE_CACHE_TTL = 300
+
+# client reuse
+CLIENT_CACHE_SIZE = 64
+CLIENT_CACHE_TTL = 60
+TOKEN_EXPIRY_MARGIN = 60
+
+# retries
+DEFAULT_MAX_RETRIES = 3
+RETRY_STATUS_CODES = [429, 502, 503, 504]
+IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']
+RETRY_BACKOFF_FACTOR = 1
+RETRY_MAX_BACKOFF = 30
+RETRY_JITTER = 0.1
+RETRY_TIME_BUDGET = 60
+
+# client side rate limiting
+DEFAULT_RATE_LIMIT = 20
+RATE_LIMIT_BURST_FACTOR = 2
+RATE_LIMIT_MIN_FRACTION = 0.05
+RATE_LIMIT_FLOOR = 0.5
+RATE_LIMIT_DECREASE = 0.5
+RATE_LIMIT_SLOWDOWN = 0.8
+RATE_LIMIT_INCREASE = 0.5
+RATE_LIMIT_LOW_WATERMARK = 0.1
+
+# conditional request cache
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 86400
+
+# persistent metadata cache
+PERSISTENT_CACHE_LOCK_TIMEOUT = 5
+METADATA_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'azure-devops', 'metadata_cache.db')
+METADATA_CACHE_MAX_ENTRIES = 5000
+METADATA_CACHE_TTL = 3600
+METADATA_CATALOG_MAPPING = {
+    "All": "",
+    "Projects": "projects",
+    "Repositories": "repositories",
+    "Pipelines": "pipelines"
+}
+
+# immutable object cache
+IMMUTABLE_CACHE_SIZE = 2048
+IMMUTABLE_CACHE_TTL = 86400
+IMMUTABLE_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'azure-devops', 'immutable_objects.db')
+IMMUTABLE_CACHE_MAX_ENTRIES = 50000
+IMMUTABLE_RUN_STATES = ['completed']
+
+# batch commit lookup
+COMMITS_BATCH_SIZE = 100
+# fields of a full commit that the commits batch API does not return
+COMMIT_DETAIL_FIELDS = ['treeId', 'parents', 'push', '_links']
+
+# multi repository listings
+SORT_ORDER_MAPPING = {
+    "Ascending": "asc",
+    "Descending": "desc"
+}
+
+# pipeline run polling
+DEFAULT_WAIT_TIMEOUT = 600
+DEFAULT_POLL_INTERVAL = 10
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_INTERVAL = 60
+
+# incremental sync
+# watermarks must survive temp directory cleanup and reboots, so they are not kept in the temp directory
+SYNC_STATE_PATH = os.path.join(os.path.expanduser('~'), '.azure-devops', 'sync_state.db')
+SYNC_STATE_MAX_ENTRIES = 10000
+SYNC_CLOSED_STATUSES = ['all', 'completed', 'abandoned']
+
+# streaming responses
+STREAM_CHUNK_SIZE = 65536
+
+# output shaping
+COMPACT_REMOVED_FIELDS = ['_links', 'url', 'imageUrl']
+COMPACT_OUTPUT_PRESETS = {
+    'list_pipelines': {'remove': [], 'collapse': []},
+    'list_pipeline_runs': {'remove': [], 'collapse': ['pipeline']},
+    'get_pipeline_run': {'remove': [], 'collapse': ['pipeline']},
+    'list_repositories': {'remove': ['remoteUrl', 'sshUrl', 'webUrl'], 'collapse': ['project']},
+    'list_branches': {'remove': ['descriptor'], 'collapse': ['repository']},
+    'list_commits': {'remove': ['remoteUrl'], 'collapse': []},
+    'get_commit': {'remove': ['remoteUrl'], 'collapse': []},
+    'get_commits_batch': {'remove': ['remoteUrl'], 'collapse': []},
+    'list_pull_requests': {'remove': ['descriptor', 'reviewerUrl'], 'collapse': ['repository', 'project']},
+    'get_pull_requests_by_id': {'remove': ['descriptor', 'reviewerUrl'], 'collapse': ['repository', 'project']}
+}
+COMPACT_REFERENCE_FIELDS = ['id', 'name']
+
+# timeouts
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_ACTION_TIMEOUT = 0
+
+# hedged requests
+DEFAULT_HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MAX_RATIO = 0.1
+HEDGE_BUDGET_WINDOW = 1000
+HEDGE_POOL_SIZE = 16
+HEDGE_POOL_FACTOR = 2
+LATENCY_WINDOW = 200
@@ -5,15 +5,41 @@ Copyright (c) 2024 Fortinet Inc
 Copyright end
 """
 
-from requests import request
-from time import time, ctime
+import threading
+from time import time
 from datetime import datetime
 from connectors.core.connector import get_logger, ConnectorError
 from .constants import *
+from .utils import get_session, get_timeouts, get_request_timeout, config_fingerprint
 from connectors.core.utils import update_connnector_config
 
 logger = get_logger('azure-devops')
 
+_token_cache = {}
+_token_locks = {}
+_token_locks_guard = threading.Lock()
+
+
+def normalize_expires_on(expires_on):
+    if expires_on in [None, '']:
+        return 0.0
+    try:
+        return float(expires_on)
+    except (TypeError, ValueError):
+        pass
+    for date_format in LEGACY_EXPIRY_FORMATS:
+        try:
+            return datetime.strptime(expires_on, date_format).timestamp()
+        except (TypeError, ValueError):
+            continue
+    logger.warning('Unrecognized token expiry {0}, treating the token as expired'.format(expires_on))
+    return 0.0
+
+
+def _get_token_lock(cache_key):
+    with _token_locks_guard:
+        return _token_locks.setdefault(cache_key, threading.Lock())
+
 
 class MicrosoftAuth:
 
@@ -29,16 +55,15 @@ class MicrosoftAuth:
         self.refresh_token = ""
         self.code = config.get("code")
         self.redirect_url = config.get("redirect_url") if config.get("redirect_url") else DEFAULT_REDIRECT_URL
-
-    def convert_ts_epoch(self, ts):
-        datetime_object = datetime.strptime(ctime(ts), "%a %b %d %H:%M:%S %Y")
-        return datetime_object.timestamp()
+        self.session = get_session(config)
+        self.connect_timeout, self.read_timeout = get_timeouts(config)
+        self.cache_key = config_fingerprint(config)
 
     def generate_token(self, refresh_token_flag):
         try:
             resp = self.acquire_token_on_behalf_of_user(refresh_token_flag)
             ts_now = time()
-            resp['expiresOn'] = (ts_now + resp['expires_in']) if resp.get("expires_in") else None
+            resp['expiresOn'] = (ts_now + float(resp['expires_in'])) if resp.get("expires_in") else 0.0
             resp['access_token'] = resp.get("access_token")
             return resp
         except Exception as err:
@@ -47,28 +72,60 @@ class MicrosoftAuth:
 
     def get_validated_token(self, connector_config, connector_info):
         if CONFIG_SUPPORTS_TOKEN:
-            ts_now = time()
             if not connector_config.get('access_token'):
                 logger.error('Error occurred while connecting server: Unauthorized')
                 raise ConnectorError('Error occurred while connecting server: Unauthorized')
-            expires = connector_config['expiresOn']
-            expires_ts = self.convert_ts_epoch(expires)
-            if ts_now > float(expires_ts):
-                REFRESH_TOKEN_FLAG = True
+            expires = normalize_expires_on(connector_config.get('expiresOn'))
+            cached_token = _token_cache.get(self.cache_key)
+            if cached_token and cached_token['expiresOn'] > expires:
+                connector_config.update(cached_token)
+                expires = cached_token['expiresOn']
+            connector_config['expiresOn'] = expires
+            ts_now = time()
+            if ts_now > expires:
                 logger.info("Token expired at {0}".format(expires))
-                self.refresh_token = connector_config["refresh_token"]
-                token_resp = self.generate_token(REFRESH_TOKEN_FLAG)
-                connector_config['access_token'] = token_resp['access_token']
-                connector_config['expiresOn'] = token_resp['expiresOn']
-                connector_config['refresh_token'] = token_resp.get('refresh_token')
-                update_connnector_config(connector_info['connector_name'], connector_info['connector_version'],
-                                         connector_config,
-                                         connector_config['config_id'])
-
-                return "Bearer {0}".format(connector_config.get('access_token'))
+                with _get_token_lock(self.cache_key):
+                    cached_token = _token_cache.get(self.cache_key)
+                    if cached_token and cached_token['expiresOn'] > time():
+                        connector_config.update(cached_token)
+                    else:
+                        self.refresh_access_token(connector_config, connector_info)
+            elif ts_now > expires - TOKEN_REFRESH_AHEAD:
+                self.refresh_in_background(connector_config, connector_info)
             else:
                 logger.info("Token is valid till {0}".format(expires))
-                return "Bearer {0}".format(connector_config.get('access_token'))
+            return "Bearer {0}".format(connector_config.get('access_token'))
+
+    def refresh_access_token(self, connector_config, connector_info):
+        self.refresh_token = connector_config["refresh_token"]
+        token_resp = self.generate_token(True)
+        connector_config['access_token'] = token_resp['access_token']
+        connector_config['expiresOn'] = token_resp['expiresOn']
+        connector_config['refresh_token'] = token_resp.get('refresh_token')
+        _token_cache[self.cache_key] = {
+            'access_token': connector_config['access_token'],
+            'expiresOn': connector_config['expiresOn'],
+            'refresh_token': connector_config['refresh_token']
+        }
+        update_connnector_config(connector_info['connector_name'], connector_info['connector_version'],
+                                 connector_config,
+                                 connector_config['config_id'])
+
+    def refresh_in_background(self, connector_config, connector_info):
+        token_lock = _get_token_lock(self.cache_key)
+        if not token_lock.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                logger.info("Refreshing token ahead of expiry at {0}".format(connector_config['expiresOn']))
+                self.refresh_access_token(dict(connector_config), connector_info)
+            except Exception as err:
+                logger.warning("Background token refresh failed: {0}".format(err))
+            finally:
+                token_lock.release()
+
+        threading.Thread(target=refresh, daemon=True).start()
 
     def acquire_token_on_behalf_of_user(self, refresh_token_flag):
         try:
@@ -85,7 +142,8 @@ class MicrosoftAuth:
             else:
                 data['grant_type'] = REFRESH_TOKEN,
                 data['refresh_token'] = self.refresh_token
-            response = request("POST", self.token_url, data=data, verify=self.verify_ssl)
+            response = self.session.request("POST", self.token_url, data=data, verify=self.verify_ssl,
+                                            timeout=get_request_timeout(self.connect_timeout, self.read_timeout))
             if response.status_code in [200, 204, 201]:
                 return response.json()
 
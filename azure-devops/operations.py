@@ -5,17 +5,55 @@ Copyright (c) 2024 Fortinet Inc
 Copyright end
 """
 
+import copy
 import json
+import random
+import re
+import threading
 import requests
+from time import time, sleep, monotonic
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED, \
+    TimeoutError as FutureTimeoutError
 from .microsoft_api_auth import *
 from connectors.core.connector import get_logger, ConnectorError
 from .constants import *
+from .persistent_cache import get_persistent_cache
+from .async_client import ASYNC_CLIENT_AVAILABLE, make_requests as make_async_requests
+from .utils import get_session, get_int_config, get_rate_limiter, config_fingerprint, iter_json_items, json_dumps, \
+    json_loads, get_timeouts, get_deadline, get_request_timeout, split_deadline, propagate_action_context, \
+    get_action_stats, reset_action_stats, get_latency_tracker, raise_response_error, TTLCache
 
 logger = get_logger('azure-devops')
 
+ENDPOINT_ID_SEGMENT = re.compile(r'/[^/]*\d[^/]*')
+
+
+def _endpoint_key(url):
+    # group urls by endpoint, ids, guids and hashes do not change the latency profile
+    return ENDPOINT_ID_SEGMENT.sub('/*', urlsplit(url).path)
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+_ref_cache = TTLCache(REF_CACHE_SIZE, REF_CACHE_TTL)
+_identity_cache = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+_client_cache = TTLCache(CLIENT_CACHE_SIZE, CLIENT_CACHE_TTL)
+_response_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+_immutable_cache = TTLCache(IMMUTABLE_CACHE_SIZE, IMMUTABLE_CACHE_TTL)
+
 
 class AzureDevOps:
     def __init__(self, config):
+        action_stats = get_action_stats()
+        if action_stats is not None:
+            action_stats.increment('client_constructions')
         self.server_url = config.get('server_url').strip('/') + '/{0}'.format(config.get('organization'))
         if not (self.server_url.startswith('https://') or self.server_url.startswith('http://')):
             self.server_url = 'https://' + self.server_url
@@ -32,8 +70,134 @@ class AzureDevOps:
             self.headers['Authorization'] = ms_client.get_validated_token(config, config.get('connector_info'))
         self.verify_ssl = config.get('verify_ssl')
         self.api_version = config.get('api_version') if config.get('api_version') not in [None, ''] else API_VERSION
+        self.session = get_session(config)
+        self.config_id = config.get('config_id')
+        self.max_concurrency = get_int_config(config, 'max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        self.max_retries = get_int_config(config, 'max_retries', DEFAULT_MAX_RETRIES, minimum=0)
+        self.rate_limiter = get_rate_limiter(config)
+        self.cache_namespace = config_fingerprint(config)
+        self.connect_timeout, self.read_timeout = get_timeouts(config)
+        self.latency_tracker = get_latency_tracker(config)
+        self.hedge_percentile = min(get_int_config(config, 'hedge_percentile', DEFAULT_HEDGE_PERCENTILE), 99)
+        if self.latency_tracker is not None:
+            hedge_workers = max(HEDGE_POOL_SIZE, HEDGE_POOL_FACTOR * self.max_concurrency)
+            self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers,
+                                                      thread_name_prefix='azure-devops-hedge')
+            self._hedge_slots = threading.BoundedSemaphore(hedge_workers)
+
+    def _get_retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return max(delay, 0) * (1 + random.uniform(0, RETRY_JITTER))
+        rate_limit_delay = response.headers.get('X-RateLimit-Delay')
+        if rate_limit_delay:
+            try:
+                return float(rate_limit_delay) * (1 + random.uniform(0, RETRY_JITTER))
+            except ValueError:
+                pass
+        return random.uniform(0, min(RETRY_MAX_BACKOFF, RETRY_BACKOFF_FACTOR * (2 ** attempt)))
 
-    def make_request(self, endpoint, method='GET', data=None, params={}, files=None, is_url=False):
+    def _submit_attempt(self, send, started=None):
+        def run():
+            try:
+                if started is not None:
+                    started.set()
+                return send()
+            finally:
+                self._hedge_slots.release()
+        return self._hedge_executor.submit(propagate_action_context(run))
+
+    def _request(self, method, url, **kwargs):
+        def send():
+            started_at = monotonic()
+            response = self.session.request(method, url, auth=self.auth, verify=self.verify_ssl, **kwargs)
+            if latency_tracker:
+                latency_tracker.record(key, monotonic() - started_at)
+            return response
+
+        latency_tracker = self.latency_tracker
+        if latency_tracker is None or method.upper() != 'GET' or kwargs.get('stream'):
+            return send()
+        key = _endpoint_key(url)
+        latency_tracker.count_request()
+        threshold = latency_tracker.percentile(key, self.hedge_percentile)
+        # attempts only leave the caller's thread when a hedge worker is free, so they never wait in a queue
+        if threshold is None or not self._hedge_slots.acquire(blocking=False):
+            return send()
+        started = threading.Event()
+        first = self._submit_attempt(send, started)
+        started.wait()
+        try:
+            return first.result(timeout=threshold)
+        except FutureTimeoutError:
+            pass
+        if not self._hedge_slots.acquire(blocking=False):
+            return first.result()
+        # cap the extra load, and never wait for the rate limiter to send a hedge
+        if not latency_tracker.try_hedge(HEDGE_MAX_RATIO) or \
+                (self.rate_limiter and not self.rate_limiter.try_acquire()):
+            self._hedge_slots.release()
+            return first.result()
+        logger.debug('Hedging request for url {0} after {1:.3f} seconds'.format(url, threshold))
+        pending = {first, self._submit_attempt(send)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as err:
+                    error = error or err
+                    continue
+                for loser in pending:
+                    loser.add_done_callback(_close_response)
+                return response
+        raise error
+
+    def _send(self, method, url, retry=None, extra_headers=None, **kwargs):
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        headers = dict(self.headers, **extra_headers) if extra_headers else self.headers
+        deadline = monotonic() + RETRY_TIME_BUDGET
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            timeout = get_request_timeout(self.connect_timeout, self.read_timeout)
+            response = self._request(method, url, headers=headers, timeout=timeout, **kwargs)
+            if self.rate_limiter:
+                self.rate_limiter.update(response)
+            if not retry or attempt >= self.max_retries or response.status_code not in RETRY_STATUS_CODES:
+                return response
+            delay = self._get_retry_delay(response, attempt)
+            if monotonic() + delay > min(deadline, get_deadline() or deadline):
+                logger.warning('Retry budget exhausted for url {0}'.format(url))
+                return response
+            attempt += 1
+            logger.warning('Received status {0} for url {1}, retry {2}/{3} in {4:.2f} seconds'.format(
+                response.status_code, url, attempt, self.max_retries, delay))
+            response.close()
+            sleep(delay)
+
+    def _get_cached_response(self, url, params):
+        cache_key = (self.cache_namespace, url, tuple(sorted((k, str(v)) for k, v in params.items())))
+        cached_response = _response_cache.get(cache_key)
+        extra_headers = {'If-None-Match': cached_response[0]} if cached_response else None
+        return cache_key, cached_response, extra_headers
+
+    def _set_cached_response(self, cache_key, etag, result):
+        _response_cache.set(cache_key, (etag, copy.deepcopy(result)))
+
+    def make_request(self, endpoint, method='GET', data=None, params={}, files=None, is_url=False,
+                     return_headers=False, retry=None, use_cache=False, stream=False):
         try:
             url = endpoint if is_url else self.server_url + endpoint
             logger.info('Executing url {}'.format(url))
@@ -45,32 +209,33 @@ class AzureDevOps:
             except Exception as err:
                 logger.debug(f"Error in curl utils: {str(err)}")
 
-            response = requests.request(method, url, auth=self.auth, params=params, files=files,
-                                        data=data, headers=self.headers, verify=self.verify_ssl)
+            cache_key = None
+            cached_response = None
+            extra_headers = None
+            if use_cache and method.upper() == 'GET':
+                cache_key, cached_response, extra_headers = self._get_cached_response(url, params)
+            response = self._send(method, url, retry=retry, extra_headers=extra_headers, params=params, files=files,
+                                  data=data, stream=stream)
             if response.ok:
                 logger.info('successfully get response for url {}'.format(url))
                 if method.lower() == 'delete':
                     return response
                 else:
                     if response.status_code == 304:
-                        return None
+                        result = copy.deepcopy(cached_response[1]) if cached_response else None
+                        return (result, response.headers) if return_headers else result
                     elif response.status_code == 203:
                         raise ConnectorError("Invalid Access Token for the given organization.")
-                    return response.json()
+                    if stream:
+                        return self._stream_items(response), response.headers
+                    result = json_loads(response.content)
+                    if cache_key and response.headers.get('ETag'):
+                        self._set_cached_response(cache_key, response.headers['ETag'], result)
+                    if return_headers:
+                        return result, response.headers
+                    return result
             else:
-                try:
-                    error_response = response.json()
-                    if error_response.get('message'):
-                        error_description = error_response['message']
-                        raise ConnectorError({'error_description': error_description})
-                    raise ConnectorError(error_response)
-                except Exception as error:
-                    logger.warning("error: {0}".format(error))
-                    error_response = {
-                        "status_code": response.status_code,
-                        "error_message": response.text if response.text else response.reason
-                    }
-                    raise ConnectorError('Error occurred: {0}'.format(error_response))
+                raise_response_error(response.status_code, response.content, response.text, response.reason)
         except requests.exceptions.SSLError:
             raise ConnectorError('SSL certificate validation failed')
         except requests.exceptions.ConnectTimeout:
@@ -83,12 +248,124 @@ class AzureDevOps:
             raise ConnectorError(str(err))
         raise ConnectorError(response.text)
 
+    def make_requests(self, requests_kwargs):
+        if not requests_kwargs:
+            return []
+        if ASYNC_CLIENT_AVAILABLE:
+            return make_async_requests(self, requests_kwargs)
+
+        def run(kwargs):
+            try:
+                return self.make_request(**kwargs)
+            except ConnectorError as err:
+                return err
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(requests_kwargs))) as executor:
+            return list(executor.map(propagate_action_context(run), requests_kwargs))
+
+    def _stream_items(self, response):
+        try:
+            yield from iter_json_items(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+        except requests.exceptions.RequestException as err:
+            raise ConnectorError('Error occurred while reading the response: {0}'.format(err))
+        except ValueError as err:
+            raise ConnectorError('Invalid JSON response: {0}'.format(err))
+        finally:
+            response.close()
+
+    def paginate(self, endpoint, params=None, max_items=None, skip_key=None, top_key='$top'):
+        params = dict(params or {})
+        if not params.get(top_key):
+            params[top_key] = DEFAULT_PAGE_SIZE
+        if skip_key:
+            params[skip_key] = params.get(skip_key) or 0
+            if self.max_concurrency > 1:
+                yield from self._prefetch_pages(endpoint, params, max_items, skip_key, top_key)
+                return
+        count = 0
+        while True:
+            items, headers = self.make_request(endpoint, params=dict(params), return_headers=True, stream=True)
+            page_count = 0
+            for item in items:
+                yield item
+                count += 1
+                page_count += 1
+                if max_items and count >= max_items:
+                    return
+            if skip_key:
+                if page_count < int(params[top_key]):
+                    return
+                params[skip_key] += page_count
+            else:
+                continuation_token = headers.get(CONTINUATION_TOKEN_HEADER)
+                if not page_count or not continuation_token:
+                    return
+                params['continuationToken'] = continuation_token
+
+    def _prefetch_pages(self, endpoint, params, max_items, skip_key, top_key):
+        page_size = int(params[top_key])
+        next_offset = int(params[skip_key])
+        end_offset = next_offset + max_items if max_items else None
+        pending = deque()
+        count = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            def submit_next_page():
+                nonlocal next_offset
+                if end_offset is not None and next_offset >= end_offset:
+                    return
+                page_params = dict(params)
+                page_params[skip_key] = next_offset
+                pending.append(executor.submit(propagate_action_context(self.make_request), endpoint,
+                                               params=page_params))
+                next_offset += page_size
+
+            for _ in range(self.max_concurrency):
+                submit_next_page()
+            try:
+                while pending:
+                    result = pending.popleft().result()
+                    items = result.get('value', []) if isinstance(result, dict) else []
+                    for item in items:
+                        yield item
+                        count += 1
+                        if max_items and count >= max_items:
+                            return
+                    if len(items) < page_size:
+                        return
+                    submit_next_page()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+def get_client(config):
+    cache_key = config_fingerprint(config, CLIENT_CONFIG_KEYS)
+    client = _client_cache.get(cache_key)
+    if client is None:
+        client = AzureDevOps(config)
+        ttl = CLIENT_CACHE_TTL
+        if client.auth is None and config.get('expiresOn'):
+            ttl = min(ttl, float(config['expiresOn']) - time() - TOKEN_EXPIRY_MARGIN)
+        if ttl > 0:
+            _client_cache.set(cache_key, client, ttl=ttl)
+    return client
+
+
+def reset_client_stats():
+    reset_action_stats()
+
+
+def get_client_stats():
+    action_stats = get_action_stats()
+    return {'client_constructions': action_stats.get('client_constructions') if action_stats else 0}
+
 
 def _check_health(config):
     try:
         if config.get('auth_type') == 'On behalf of User - Delegate Permission':
             check(config, config.get('connector_info'))
-        list_projects(config, {"$top": 1})
+        # call the API directly, a cached project list would hide an invalid configuration
+        get_client(config).make_request("/_apis/projects", params={"$top": 1})
         return True
     except Exception as err:
         logger.exception(str(err))
@@ -99,6 +376,333 @@ def _build_payload(params):
     return {key: val for key, val in params.items() if val is not None and val != ''}
 
 
+def _get_max_items(params):
+    fetch_all = params.pop('fetch_all', False)
+    max_items = params.pop('max_items', None)
+    try:
+        max_items = int(max_items) if max_items not in [None, ''] else None
+    except (TypeError, ValueError):
+        raise ConnectorError('Invalid value for Max Records: {0}'.format(max_items))
+    if not fetch_all and not max_items:
+        return None
+    return max_items or 0
+
+
+def _list_items(client, endpoint, params, skip_key=None, top_key='$top', use_cache=False, shaper=None):
+    max_items = _get_max_items(params)
+    payload = _build_payload(params)
+    if max_items is None:
+        return _shape_output(client.make_request(endpoint, params=payload, use_cache=use_cache), shaper)
+    items = client.paginate(endpoint, params=payload, max_items=max_items, skip_key=skip_key, top_key=top_key)
+    # shape the items as the pages are streamed so that the full objects are never held together
+    items = [shaper(item) for item in items] if shaper else list(items)
+    return {'count': len(items), 'value': items}
+
+
+def get_metadata_cache(config):
+    if not config.get('metadata_cache'):
+        return None
+    try:
+        return get_persistent_cache(METADATA_CACHE_PATH, METADATA_CACHE_MAX_ENTRIES)
+    except Exception as err:
+        logger.warning('Metadata cache is unavailable: {0}'.format(err))
+        return None
+
+
+def _get_catalog(config, catalog, project, endpoint, params, fetch):
+    metadata_cache = get_metadata_cache(config)
+    if metadata_cache is None:
+        return fetch()
+    cache_key = json.dumps([config_fingerprint(config), endpoint, params], sort_keys=True, default=str)
+    try:
+        result = metadata_cache.get(cache_key)
+        if result is not None:
+            return result
+    except Exception as err:
+        logger.warning('Error occurred while reading the metadata cache: {0}'.format(err))
+    result = fetch()
+    try:
+        metadata_cache.set(cache_key, result, ttl=get_int_config(config, 'metadata_cache_ttl', METADATA_CACHE_TTL),
+                           organization=config.get('organization'), project=project, catalog=catalog)
+    except Exception as err:
+        logger.warning('Error occurred while writing the metadata cache: {0}'.format(err))
+    return result
+
+
+def get_sync_state_store(config):
+    try:
+        return get_persistent_cache(config.get('sync_state_path') or SYNC_STATE_PATH, SYNC_STATE_MAX_ENTRIES)
+    except Exception as err:
+        raise ConnectorError('Incremental sync state is unavailable: {0}'.format(err))
+
+
+def _sync_state_key(config, catalog, project, repository, sync_key):
+    return json.dumps([str(config.get('server_url', '')).strip('/').lower(), config.get('organization'), catalog,
+                       project, repository, sync_key or ''])
+
+
+def _get_watermark(store, state_key, catalog, project, repository):
+    watermark = store.get(state_key)
+    if watermark is None:
+        logger.warning('No {0} sync watermark found for {1}/{2}, running a full sync'.format(
+            catalog, project, repository))
+    return watermark
+
+
+def _sync_commits(client, config, endpoint, params, project, repository, sync_key):
+    store = get_sync_state_store(config)
+    state_key = _sync_state_key(config, 'commits', project, repository, sync_key)
+    watermark = _get_watermark(store, state_key, 'commits', project, repository)
+    full_sync, watermark = watermark is None, watermark or {}
+    params.pop('fetch_all', None), params.pop('max_items', None)
+    if watermark.get('fromDate'):
+        params['searchCriteria.fromDate'] = watermark['fromDate']
+    seen_ids = set(watermark.get('commitIds', []))
+    commits = [commit for commit in client.paginate(endpoint, params=_build_payload(params),
+                                                    skip_key='searchCriteria.$skip', top_key='searchCriteria.$top')
+               if commit.get('commitId') not in seen_ids]
+    if commits:
+        # fromDate is inclusive, so remember the commits at the watermark to skip them on the next run
+        latest = max(commits, key=lambda commit: _parse_datetime(_get_field(commit, 'committer.date')) or datetime.min)
+        from_date = _get_field(latest, 'committer.date')
+        commit_ids = [commit['commitId'] for commit in commits if _get_field(commit, 'committer.date') == from_date]
+        if from_date == watermark.get('fromDate'):
+            commit_ids += list(seen_ids)
+        watermark = {'fromDate': from_date, 'commitIds': commit_ids}
+        store.set(state_key, watermark, organization=config.get('organization'), project=project, catalog='commits')
+    return {'count': len(commits), 'value': commits, 'watermark': watermark, 'full_sync': full_sync}
+
+
+def _sync_pull_requests(client, config, endpoint, params, project, repository, sync_key):
+    store = get_sync_state_store(config)
+    state_key = _sync_state_key(config, 'pull_requests', project, repository, sync_key)
+    watermark = _get_watermark(store, state_key, 'pull requests', project, repository)
+    full_sync, watermark = watermark is None, watermark or {}
+    params.pop('fetch_all', None), params.pop('max_items', None)
+    synced_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    last_id = watermark.get('pullRequestId') or 0
+    pull_requests = {}
+    # pull requests are returned newest first, so stop paging at the first one seen on a previous run
+    for pull_request in client.paginate(endpoint, params=_build_payload(params), skip_key='$skip'):
+        if pull_request.get('pullRequestId', 0) <= last_id:
+            break
+        pull_requests[pull_request['pullRequestId']] = pull_request
+    status = params.get('searchCriteria.status')
+    # pull requests closed since the last run are changed items even if they were created before the watermark
+    if watermark.get('syncedAt') and PR_STATUS_MAPPING.get(status, status) in SYNC_CLOSED_STATUSES:
+        closed_params = dict(params, **{'searchCriteria.queryTimeRangeType': 'closed',
+                                        'searchCriteria.minTime': watermark['syncedAt']})
+        for pull_request in client.paginate(endpoint, params=_build_payload(closed_params), skip_key='$skip'):
+            pull_requests.setdefault(pull_request['pullRequestId'], pull_request)
+    watermark = {'pullRequestId': max([last_id] + list(pull_requests)), 'syncedAt': synced_at}
+    store.set(state_key, watermark, organization=config.get('organization'), project=project,
+              catalog='pull_requests')
+    pull_requests = list(pull_requests.values())
+    return {'count': len(pull_requests), 'value': pull_requests, 'watermark': watermark, 'full_sync': full_sync}
+
+
+def get_immutable_object_store(config):
+    if not config.get('immutable_object_cache'):
+        return None
+    try:
+        return get_persistent_cache(IMMUTABLE_CACHE_PATH, IMMUTABLE_CACHE_MAX_ENTRIES)
+    except Exception as err:
+        logger.warning('Immutable object cache is unavailable: {0}'.format(err))
+        return None
+
+
+def _immutable_cache_key(config, endpoint, params):
+    return json.dumps([config_fingerprint(config), endpoint.lower(), params], sort_keys=True, default=str)
+
+
+def _read_immutable_object(config, cache_key):
+    result = _immutable_cache.get(cache_key)
+    if result is not None:
+        return copy.deepcopy(result)
+    object_store = get_immutable_object_store(config)
+    if object_store is not None:
+        try:
+            result = object_store.get(cache_key)
+            if result is not None:
+                _immutable_cache.set(cache_key, copy.deepcopy(result))
+                return result
+        except Exception as err:
+            logger.warning('Error occurred while reading the immutable object cache: {0}'.format(err))
+    return None
+
+
+def _write_immutable_object(config, cache_key, result):
+    _immutable_cache.set(cache_key, copy.deepcopy(result))
+    object_store = get_immutable_object_store(config)
+    if object_store is not None:
+        try:
+            object_store.set(cache_key, result, organization=config.get('organization'))
+        except Exception as err:
+            logger.warning('Error occurred while writing the immutable object cache: {0}'.format(err))
+
+
+def _get_immutable_object(config, endpoint, params, fetch, is_immutable):
+    cache_key = _immutable_cache_key(config, endpoint, params)
+    result = _read_immutable_object(config, cache_key)
+    if result is None:
+        result = fetch()
+        if result and is_immutable(result):
+            _write_immutable_object(config, cache_key, result)
+    return result
+
+
+def _fan_out(max_workers, targets, fetch):
+    results, errors = {}, {}
+    if not targets:
+        return [], errors
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as executor:
+        fetch = propagate_action_context(fetch)
+        futures = {executor.submit(fetch, target): target for target in targets}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                results[target] = future.result()
+            except Exception as err:
+                logger.warning('Error occurred for {0}: {1}'.format(target, err))
+                errors[target] = str(err)
+    return [results[target] for target in targets if target in results], errors
+
+
+def _get_field(item, path):
+    for key in path.split('.'):
+        if not isinstance(item, dict):
+            return None
+        item = item.get(key)
+    return item
+
+
+def _sort_key(value):
+    is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+    return value is None, not is_number, value if is_number else str(value)
+
+
+def _sort_items(items, sort_by, sort_order):
+    if not sort_by:
+        return items
+    return sorted(items, key=lambda item: _sort_key(_get_field(item, sort_by)),
+                  reverse=SORT_ORDER_MAPPING.get(sort_order, 'asc') == 'desc')
+
+
+def _sorted_result(result, sort_by, sort_order):
+    if sort_by and isinstance(result, dict) and isinstance(result.get('value'), list):
+        result['value'] = _sort_items(result['value'], sort_by, sort_order)
+    return result
+
+
+def _include_fields(value, paths):
+    if isinstance(value, list):
+        return [_include_fields(item, paths) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, item in value.items():
+        sub_paths = [path[1:] for path in paths if path[0] == key]
+        if sub_paths:
+            result[key] = item if not all(sub_paths) else _include_fields(item, sub_paths)
+    return result
+
+
+def _exclude_fields(value, paths):
+    if isinstance(value, list):
+        return [_exclude_fields(item, paths) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, item in value.items():
+        sub_paths = [path[1:] for path in paths if path[0] == key]
+        if not sub_paths:
+            result[key] = item
+        elif all(sub_paths):
+            result[key] = _exclude_fields(item, sub_paths)
+    return result
+
+
+def _compact_fields(value, removed_fields, collapsed_fields):
+    if isinstance(value, list):
+        return [_compact_fields(item, removed_fields, collapsed_fields) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, item in value.items():
+        if key in removed_fields:
+            continue
+        if key in collapsed_fields and isinstance(item, dict):
+            result[key] = {field: item[field] for field in COMPACT_REFERENCE_FIELDS if field in item}
+        else:
+            result[key] = _compact_fields(item, removed_fields, collapsed_fields)
+    return result
+
+
+def _get_output_shaper(operation, params):
+    output_mode = params.pop('output_mode', None) or 'Full'
+    include_fields = handle_comma_separated_input(params.pop('include_fields', None))
+    exclude_fields = handle_comma_separated_input(params.pop('exclude_fields', None))
+    if output_mode == 'Compact':
+        preset = COMPACT_OUTPUT_PRESETS.get(operation, {})
+        removed_fields = set(COMPACT_REMOVED_FIELDS + preset.get('remove', []))
+        collapsed_fields = set(preset.get('collapse', []))
+        return lambda item: _compact_fields(item, removed_fields, collapsed_fields)
+    if output_mode == 'Custom' and (include_fields or exclude_fields):
+        include_paths = [str(path).split('.') for path in include_fields or []]
+        exclude_paths = [str(path).split('.') for path in exclude_fields or []]
+
+        def shape(item):
+            if include_paths:
+                item = _include_fields(item, include_paths)
+            if exclude_paths:
+                item = _exclude_fields(item, exclude_paths)
+            return item
+        return shape
+    return None
+
+
+def _shape_output(result, shaper):
+    if shaper is None or not isinstance(result, dict):
+        return result
+    if isinstance(result.get('value'), list):
+        return dict(result, value=[shaper(item) for item in result['value']])
+    if isinstance(result.get('value'), dict):
+        return dict(result, value={key: shaper(item) for key, item in result['value'].items()})
+    return shaper(result)
+
+
+def _list_across(client, targets, fetch, params, target_type):
+    targets = {target['name']: {'id': target['id'], 'name': target['name']} for target in targets}
+    full_sync_targets = []
+
+    def fetch_target(name):
+        items = fetch(targets[name], dict(params)) or {}
+        if isinstance(items, dict) and items.get('full_sync'):
+            full_sync_targets.append(name)
+        items = items.get('value', []) if isinstance(items, dict) else []
+        for item in items:
+            item.setdefault(target_type, targets[name])
+        return items
+
+    results, errors = _fan_out(client.max_concurrency, list(targets), fetch_target)
+    items = [item for result in results for item in result]
+    result = {'count': len(items), 'value': items, 'errors': errors}
+    if full_sync_targets:
+        result.update({'full_sync': True, 'full_sync_targets': sorted(full_sync_targets)})
+    return result
+
+
+def _list_across_repositories(client, config, project, fetch, params):
+    repositories = list_repositories(config, {'project': project}).get('value', [])
+    repositories = [repository for repository in repositories if not repository.get('isDisabled')]
+    return _list_across(client, repositories, fetch, params, 'repository')
+
+
+def _list_across_projects(client, config, fetch, params):
+    projects = list_projects(config, {'fetch_all': True}).get('value', [])
+    return _list_across(client, projects, fetch, params, 'project')
+
+
 def handle_comma_separated_input(input_value):
     if input_value and isinstance(input_value, str):
         return [i.strip() for i in input_value.split(',') if i.strip()]
@@ -108,32 +712,146 @@ def handle_comma_separated_input(input_value):
 
 
 def list_pipelines(config, params):
-    client = AzureDevOps(config)
-    endpoint = '/{0}/_apis/pipelines'.format(params.pop('project', ''))
+    client = get_client(config)
+    project = params.pop('project', '')
+    sort_by, sort_order = params.pop('sort_by', None), params.pop('sort_order', None)
+    shaper = _get_output_shaper('list_pipelines', params)
+    if params.pop('all_projects', False):
+        def list_project_pipelines(project_info, project_params):
+            return list_pipelines(config, dict(project_params, project=project_info['name']))
+        return _shape_output(_sorted_result(_list_across_projects(client, config, list_project_pipelines, params),
+                                            sort_by, sort_order), shaper)
+    if not project:
+        raise ConnectorError('Project Name is required when Organization Scope is not selected')
+    endpoint = '/{0}/_apis/pipelines'.format(project)
     field = params.pop('field', 'name') or 'name'
     order = params.pop('order', 'asc').lower() or 'asc'
     params['$orderBy'] = "{0} {1}".format(field, order)
     payload = _build_payload(params)
-    return client.make_request(endpoint, params=payload)
+    result = _get_catalog(config, 'pipelines', project, endpoint, payload,
+                          lambda: client.make_request(endpoint, params=payload))
+    return _shape_output(_sorted_result(result, sort_by, sort_order), shaper)
 
 
 def list_pipeline_runs(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     endpoint = '/{0}/_apis/pipelines/{1}/runs'.format(params.pop('project', ''), params.pop('pipelineId', ''))
+    shaper = _get_output_shaper('list_pipeline_runs', params)
     payload = _build_payload(params)
-    return client.make_request(endpoint, params=payload)
+    return _shape_output(client.make_request(endpoint, params=payload), shaper)
+
+
+def _get_pipeline_run(config, project, pipeline_id, run_id):
+    client = get_client(config)
+    endpoint = '/{0}/_apis/pipelines/{1}/runs/{2}'.format(project, pipeline_id, run_id)
+    return _get_immutable_object(config, endpoint, {}, lambda: client.make_request(endpoint, use_cache=True),
+                                 lambda run: run.get('state') in IMMUTABLE_RUN_STATES)
+
+
+def _parse_datetime(value):
+    try:
+        return datetime.fromisoformat(re.sub(r'(\.\d{6})\d+', r'\1', value).replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_wait_options(params):
+    return get_int_config(params, 'wait_timeout', DEFAULT_WAIT_TIMEOUT), \
+        get_int_config(params, 'poll_interval', DEFAULT_POLL_INTERVAL)
+
+
+def _wait_for_runs(config, runs, timeout, poll_interval):
+    client = get_client(config)
+    started_at = monotonic()
+    deadline = min(started_at + timeout, get_deadline() or started_at + timeout)
+    interval = poll_interval
+    timings = [{'polls': 0, 'waitSeconds': 0, 'durationSeconds': None, 'timedOut': False} for _ in runs]
+    errors = {}
+    pending = [index for index, run in enumerate(runs) if run.get('state') not in IMMUTABLE_RUN_STATES]
+    while pending:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        sleep(min(interval, remaining))
+        polled, poll_errors = _fan_out(client.max_concurrency, pending, lambda index: (index, _get_pipeline_run(
+            config, runs[index]['project'], runs[index]['pipelineId'], runs[index]['id'])))
+        changed = False
+        for index, run in polled:
+            timings[index]['polls'] += 1
+            changed = changed or run.get('state') != runs[index].get('state')
+            runs[index] = dict(run, project=runs[index]['project'], pipelineId=runs[index]['pipelineId'])
+            if run.get('state') in IMMUTABLE_RUN_STATES:
+                timings[index]['waitSeconds'] = round(monotonic() - started_at, 3)
+        errors.update(poll_errors)
+        pending = [index for index in pending
+                   if runs[index].get('state') not in IMMUTABLE_RUN_STATES and index not in poll_errors]
+        # poll again quickly while runs change state and back off while they are running
+        interval = poll_interval if changed else min(interval * POLL_BACKOFF_FACTOR, POLL_MAX_INTERVAL)
+    for index in pending:
+        timings[index].update({'waitSeconds': round(monotonic() - started_at, 3), 'timedOut': True})
+    for run, timing in zip(runs, timings):
+        created_date, finished_date = _parse_datetime(run.get('createdDate')), _parse_datetime(run.get('finishedDate'))
+        if created_date and finished_date:
+            timing['durationSeconds'] = round((finished_date - created_date).total_seconds(), 3)
+    return timings, errors
+
+
+def _wait_for_run(config, project, pipeline_id, run, params):
+    runs = [dict(run, project=project, pipelineId=pipeline_id)]
+    timings, errors = _wait_for_runs(config, runs, *_get_wait_options(params))
+    if errors:
+        raise ConnectorError(errors[0])
+    result = {key: value for key, value in runs[0].items() if key not in ('project', 'pipelineId')}
+    result['timing'] = timings[0]
+    return result
+
+
+def _get_pipeline_runs(config, project, pipeline_id, run_ids, params, shaper):
+    client = get_client(config)
+    fetched, errors = _fan_out(client.max_concurrency, run_ids, lambda run_id: (
+        run_id, _get_pipeline_run(config, project, pipeline_id, run_id)))
+    fetched = dict(fetched)
+    result = []
+    for run_id in run_ids:
+        entry = {'runId': run_id}
+        if run_id in fetched:
+            entry['run'] = fetched[run_id]
+        else:
+            entry['error'] = errors.get(run_id)
+        result.append(entry)
+    if params.get('wait_for_completion'):
+        # watch all the runs in one polling loop
+        waiting = [entry for entry in result if entry.get('run')]
+        runs = [dict(entry['run'], project=project, pipelineId=pipeline_id) for entry in waiting]
+        timings, wait_errors = _wait_for_runs(config, runs, *_get_wait_options(params))
+        for index, (entry, run, timing) in enumerate(zip(waiting, runs, timings)):
+            entry['run'] = {key: value for key, value in run.items() if key not in ('project', 'pipelineId')}
+            entry['timing'] = timing
+            if index in wait_errors:
+                entry['error'] = wait_errors[index]
+    for entry in result:
+        if entry.get('run'):
+            entry['run'] = _shape_output(entry['run'], shaper)
+    completed = len([entry for entry in result if (entry.get('run') or {}).get('state') in IMMUTABLE_RUN_STATES])
+    failed = len([entry for entry in result if entry.get('error')])
+    return {'count': len(result), 'completed': completed, 'failed': failed, 'value': result}
 
 
 def get_pipeline_run(config, params):
-    client = AzureDevOps(config)
-    endpoint = '/{0}/_apis/pipelines/{1}/runs/{2}'.format(params.get('project'), params.get('pipelineId'),
-                                                          params.get('runId'))
-    return client.make_request(endpoint)
+    shaper = _get_output_shaper('get_pipeline_run', params)
+    project, pipeline_id = params.get('project'), params.get('pipelineId')
+    run_ids = handle_comma_separated_input(params.get('runId'))
+    if isinstance(run_ids, list) and len(run_ids) > 1:
+        return _get_pipeline_runs(config, project, pipeline_id, list(dict.fromkeys(run_ids)), params, shaper)
+    run_id = run_ids[0] if isinstance(run_ids, list) and run_ids else params.get('runId')
+    run = _get_pipeline_run(config, project, pipeline_id, run_id)
+    if params.get('wait_for_completion') and run:
+        run = _wait_for_run(config, project, pipeline_id, run, params)
+    return _shape_output(run, shaper)
 
 
 # Need to check code with actual parameters
-def run_pipeline(config, params):
-    client = AzureDevOps(config)
+def _pipeline_run_request(params):
     endpoint = '/{0}/_apis/pipelines/{1}/runs'.format(params.get('project'), params.get('pipelineId'))
     payload = {
         'stagesToSkip': handle_comma_separated_input(params.get('stagesToSkip')),
@@ -144,73 +862,275 @@ def run_pipeline(config, params):
         'pipelineVersion': params.get('pipelineVersion', '')
     }
     payload = _build_payload(payload)
-    return client.make_request(endpoint, method='POST', data=json.dumps(payload), params=query_param)
+    return {'endpoint': endpoint, 'method': 'POST', 'data': json_dumps(payload), 'params': query_param}
+
+
+def run_pipeline(config, params):
+    client = get_client(config)
+    run = client.make_request(**_pipeline_run_request(params))
+    if params.get('wait_for_completion') and not params.get('previewRun') and run:
+        return _wait_for_run(config, params.get('project'), params.get('pipelineId'), run, params)
+    return run
+
+
+def run_pipelines_bulk(config, params):
+    client = get_client(config)
+    pipelines = params.get('pipelines') or []
+    if isinstance(pipelines, str):
+        try:
+            pipelines = json_loads(pipelines)
+        except ValueError:
+            raise ConnectorError('Invalid JSON for Pipelines: {0}'.format(pipelines))
+    if isinstance(pipelines, dict):
+        pipelines = [pipelines]
+    for pipeline in pipelines:
+        if not isinstance(pipeline, dict) or not pipeline.get('project') or not pipeline.get('pipelineId'):
+            raise ConnectorError('Each pipeline must specify a project and a pipelineId: {0}'.format(pipeline))
+    preview_run = params.get('previewRun', False)
+    responses = client.make_requests([_pipeline_run_request(dict({'previewRun': preview_run}, **pipeline))
+                                      for pipeline in pipelines])
+    result = []
+    for pipeline, response in zip(pipelines, responses):
+        entry = {'project': pipeline['project'], 'pipelineId': pipeline['pipelineId']}
+        if isinstance(response, Exception):
+            logger.warning('Error occurred while running pipeline {0}/{1}: {2}'.format(
+                pipeline['project'], pipeline['pipelineId'], response))
+            entry.update({'status': 'Failed', 'runId': None, 'error': str(response)})
+        else:
+            entry.update({'status': 'Succeeded', 'runId': (response or {}).get('id'), 'run': response})
+        result.append(entry)
+    if params.get('wait_for_completion'):
+        waiting = [entry for entry, pipeline in zip(result, pipelines) if entry.get('run')
+                   and not pipeline.get('previewRun', preview_run)]
+        runs = [dict(entry['run'], project=entry['project'], pipelineId=entry['pipelineId']) for entry in waiting]
+        timings, errors = _wait_for_runs(config, runs, *_get_wait_options(params))
+        for index, (entry, run, timing) in enumerate(zip(waiting, runs, timings)):
+            entry['run'] = {key: value for key, value in run.items() if key not in ('project', 'pipelineId')}
+            entry['timing'] = timing
+            if index in errors:
+                entry['error'] = errors[index]
+    failed = len([entry for entry in result if entry['status'] == 'Failed'])
+    return {'count': len(result), 'succeeded': len(result) - failed, 'failed': failed, 'value': result}
 
 
 def list_projects(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     endpoint = "/_apis/projects"
     params['stateFilter'] = PROJECT_STATE_MAPPING.get(params.get('stateFilter', 'Well Formed'), params.get('stateFilter'))
-    payload = _build_payload(params)
-    return client.make_request(endpoint, params=payload)
+    return _get_catalog(config, 'projects', '', endpoint, _build_payload(params),
+                        lambda: _list_items(client, endpoint, params, use_cache=True))
 
 
 def list_repositories(config, params):
-    client = AzureDevOps(config)
-    endpoint = "/{0}/_apis/git/repositories".format(params.pop('project', ''))
-    payload = _build_payload(params)
-    return client.make_request(endpoint, params=payload)
+    client = get_client(config)
+    project = params.pop('project', '')
+    sort_by, sort_order = params.pop('sort_by', None), params.pop('sort_order', None)
+    shaper = _get_output_shaper('list_repositories', params)
+    if params.pop('all_projects', False):
+        def list_project_repositories(project_info, project_params):
+            return list_repositories(config, dict(project_params, project=project_info['name']))
+        return _shape_output(_sorted_result(_list_across_projects(client, config, list_project_repositories,
+                                                                  params), sort_by, sort_order), shaper)
+    if not project:
+        raise ConnectorError('Project Name is required when Organization Scope is not selected')
+    endpoint = "/{0}/_apis/git/repositories".format(project)
+    result = _get_catalog(config, 'repositories', project, endpoint, _build_payload(params),
+                          lambda: _list_items(client, endpoint, params, use_cache=True))
+    return _shape_output(_sorted_result(result, sort_by, sort_order), shaper)
 
 
-def list_branches(config, params):
-    client = AzureDevOps(config)
-    endpoint = "/{0}/_apis/git/repositories/{1}/refs".format(params.pop('project', ''), params.pop('repository', ''))
-    payload = _build_payload(params)
-    return client.make_request(endpoint, params=payload)
+def list_branches(config, params, client=None):
+    client = client or get_client(config)
+    project = params.pop('project', '')
+    repository = params.pop('repository', '')
+    sort_by, sort_order = params.pop('sort_by', None), params.pop('sort_order', None)
+    shaper = _get_output_shaper('list_branches', params)
+    # the sort field may be shaped away, so only shape while streaming when the result is not sorted
+    stream_shaper = None if sort_by else shaper
+    if params.pop('all_repositories', False):
+        def list_repository_branches(repository_info, repository_params):
+            endpoint = "/{0}/_apis/git/repositories/{1}/refs".format(project, repository_info['id'])
+            return _list_items(client, endpoint, repository_params, shaper=stream_shaper)
+        result = _list_across_repositories(client, config, project, list_repository_branches, params)
+    else:
+        if not repository:
+            raise ConnectorError('Repository is required when All Repositories is not selected')
+        endpoint = "/{0}/_apis/git/repositories/{1}/refs".format(project, repository)
+        result = _list_items(client, endpoint, params, shaper=stream_shaper)
+    return _shape_output(_sorted_result(result, sort_by, sort_order), None if stream_shaper else shaper)
 
 
 def list_commits(config, params):
-    client = AzureDevOps(config)
-    endpoint = "/{0}/_apis/git/repositories/{1}/commits".format(params.pop('project', ''),
-                                                                params.pop('repositoryId', ''))
+    client = get_client(config)
+    project = params.pop('project', '')
+    repository = params.pop('repositoryId', '')
+    endpoint = "/{0}/_apis/git/repositories/{1}/commits".format(project, repository)
     params.pop('type', None)
     params['searchCriteria.ids'] = handle_comma_separated_input(params.get('searchCriteria.ids'))
     search_criteria = {'searchCriteria.{0}'.format(k): v for k, v in params.pop('searchCriteria', {}).items()
                        if v or isinstance(v, (int, bool))}
     params.update(search_criteria)
-    query_params = _build_payload(params)
-    return client.make_request(endpoint, params=query_params)
+    for key in ['$skip', '$top']:
+        if key in params:
+            params['searchCriteria.{0}'.format(key)] = params.pop(key)
+    shaper = _get_output_shaper('list_commits', params)
+    if params.pop('incremental_sync', False):
+        return _shape_output(_sync_commits(client, config, endpoint, params, project, repository,
+                                           params.pop('sync_key', None)), shaper)
+    params.pop('sync_key', None)
+    return _list_items(client, endpoint, params, skip_key='searchCriteria.$skip', top_key='searchCriteria.$top',
+                       shaper=shaper)
+
+
+def _commit_endpoint(project, repository, commit_id):
+    return "/{0}/_apis/git/repositories/{1}/commits/{2}".format(project, repository, commit_id)
 
 
 def get_commit(config, params):
-    client = AzureDevOps(config)
-    endpoint = "/{0}/_apis/git/repositories/{1}/commits/{2}" \
-        .format(params.pop('project', ''), params.pop('repositoryId', ''), params.pop('commitId', ''))
+    client = get_client(config)
+    endpoint = _commit_endpoint(params.pop('project', ''), params.pop('repositoryId', ''), params.pop('commitId', ''))
+    shaper = _get_output_shaper('get_commit', params)
     payload = _build_payload(params)
-    return client.make_request(endpoint, params=payload)
+    return _shape_output(_get_immutable_object(config, endpoint, payload,
+                                               lambda: client.make_request(endpoint, params=payload, use_cache=True),
+                                               lambda commit: bool(commit.get('commitId'))), shaper)
+
+
+def _commits_batch_endpoint(project, repository):
+    return "/{0}/_apis/git/repositories/{1}/commitsbatch".format(project, repository)
+
+
+def _commits_batch_cache_key(config, project, repository, commit_id):
+    # batch items are reduced commit references, keep them apart from the full commits cached by get_commit
+    return _immutable_cache_key(config, _commits_batch_endpoint(project, repository), {'commitId': commit_id})
+
+
+def get_commits_batch(config, params):
+    client = get_client(config)
+    project = params.get('project', '')
+    commits = params.get('commits') or []
+    if isinstance(commits, str):
+        try:
+            commits = json_loads(commits)
+        except ValueError:
+            raise ConnectorError('Invalid JSON for Commits: {0}'.format(commits))
+    commit_groups = {}
+    for commit in commits:
+        if not isinstance(commit, dict) or not commit.get('repositoryId') or not commit.get('commitId'):
+            raise ConnectorError('Each commit must specify a repositoryId and a commitId: {0}'.format(commit))
+        commit_groups.setdefault(commit['repositoryId'], [])
+        if commit['commitId'] not in commit_groups[commit['repositoryId']]:
+            commit_groups[commit['repositoryId']].append(commit['commitId'])
+    results, errors = {}, {}
+
+    def fetch_missing_commits(repository, commit_ids):
+        missing_ids = []
+        for commit_id in commit_ids:
+            commit = _read_immutable_object(config, _commits_batch_cache_key(config, project, repository, commit_id))
+            if commit is not None:
+                results[commit_id] = commit
+            else:
+                missing_ids.append(commit_id)
+        return missing_ids
+
+    def store_commit(repository, commit_id, commit):
+        _write_immutable_object(config, _commits_batch_cache_key(config, project, repository, commit_id), commit)
+        results[commit_id] = commit
+
+    def store_commit_batch(repository, commit_ids, response):
+        if isinstance(response, Exception):
+            # the server is throttling or rejecting us, so do not retry the chunk one commit at a time
+            logger.warning('Batch commit lookup failed for repository {0}: {1}'.format(repository, response))
+            errors.update({commit_id: str(response) for commit_id in commit_ids})
+            return []
+        batch = {commit.get('commitId'): commit for commit in (response or {}).get('value', [])}
+        omitted_ids = []
+        for commit_id in commit_ids:
+            if commit_id in batch:
+                store_commit(repository, commit_id, batch[commit_id])
+            else:
+                omitted_ids.append((repository, commit_id))
+        return omitted_ids
+
+    batches = []
+    for repository, commit_ids in commit_groups.items():
+        missing_ids = fetch_missing_commits(repository, commit_ids)
+        batches += [(repository, missing_ids[i:i + COMMITS_BATCH_SIZE])
+                    for i in range(0, len(missing_ids), COMMITS_BATCH_SIZE)]
+    responses = client.make_requests([{
+        'endpoint': _commits_batch_endpoint(project, repository),
+        'method': 'POST',
+        'data': json_dumps({'ids': commit_ids, '$top': len(commit_ids)}),
+        'retry': True
+    } for repository, commit_ids in batches])
+    omitted_ids = []
+    for (repository, commit_ids), response in zip(batches, responses):
+        omitted_ids += store_commit_batch(repository, commit_ids, response)
+    # look up the commits a successful batch response left out individually, with bounded concurrency
+    responses = client.make_requests([{'endpoint': _commit_endpoint(project, repository, commit_id)}
+                                      for repository, commit_id in omitted_ids])
+    for (repository, commit_id), commit in zip(omitted_ids, responses):
+        if isinstance(commit, Exception):
+            errors[commit_id] = str(commit)
+        else:
+            store_commit(repository, commit_id, {k: v for k, v in commit.items() if k not in COMMIT_DETAIL_FIELDS})
+    results = {commit_id: results[commit_id] for commit_ids in commit_groups.values() for commit_id in commit_ids
+               if commit_id in results}
+    return _shape_output({'count': len(results), 'value': results, 'errors': errors},
+                         _get_output_shaper('get_commits_batch', params))
 
 
 def list_pull_requests(config, params):
-    client = AzureDevOps(config)
-    endpoint = "/{0}/_apis/git/repositories/{1}/pullrequests".format(
-        params.pop('project', ''), params.pop('repositoryId', ''))
+    client = get_client(config)
+    project = params.pop('project', '')
+    repository = params.pop('repositoryId', '')
+    all_repositories = params.pop('all_repositories', False)
+    all_projects = params.pop('all_projects', False)
+    if not all_projects and not project:
+        raise ConnectorError('Project Name is required when Organization Scope is not selected')
+    sort_by, sort_order = params.pop('sort_by', None), params.pop('sort_order', None)
     params['searchCriteria.status'] = PROJECT_STATE_MAPPING.get(params.get('searchCriteria.status', 'Not Set'),
                                                                 params.get('searchCriteria.status'))
     search_criteria = {'searchCriteria.{0}'.format(k): v for k, v in params.pop('searchCriteria', {}).items()}
     params.update(search_criteria)
-    payload = _build_payload(params)
-    return client.make_request(endpoint, params=payload)
+    incremental_sync, sync_key = params.pop('incremental_sync', False), params.pop('sync_key', None)
+    shaper = _get_output_shaper('list_pull_requests', params)
+    # the sort field may be shaped away, so only shape while streaming when the result is not sorted
+    stream_shaper = None if sort_by else shaper
+
+    def list_items(endpoint, items_params, sync_project, sync_repository):
+        if incremental_sync:
+            return _shape_output(_sync_pull_requests(client, config, endpoint, items_params, sync_project,
+                                                     sync_repository, sync_key), stream_shaper)
+        return _list_items(client, endpoint, items_params, skip_key='$skip', shaper=stream_shaper)
+
+    if all_projects:
+        def list_project_pull_requests(project_info, project_params):
+            endpoint = "/{0}/_apis/git/pullrequests".format(project_info['id'])
+            return list_items(endpoint, project_params, project_info['id'], '')
+        result = _list_across_projects(client, config, list_project_pull_requests, params)
+    elif all_repositories:
+        def list_repository_pull_requests(repository_info, repository_params):
+            endpoint = "/{0}/_apis/git/repositories/{1}/pullrequests".format(project, repository_info['id'])
+            return list_items(endpoint, repository_params, project, repository_info['id'])
+        result = _list_across_repositories(client, config, project, list_repository_pull_requests, params)
+    else:
+        if not repository:
+            raise ConnectorError('Repository is required when All Repositories is not selected')
+        endpoint = "/{0}/_apis/git/repositories/{1}/pullrequests".format(project, repository)
+        result = list_items(endpoint, params, project, repository)
+    return _shape_output(_sorted_result(result, sort_by, sort_order), None if stream_shaper else shaper)
 
 
 def get_pull_requests_by_id(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     endpoint = "/{0}/_apis/git/pullrequests/{1}".format(
         params.pop('project', ''), params.pop('pullRequestId', ''))
-    return client.make_request(endpoint)
+    return _shape_output(client.make_request(endpoint), _get_output_shaper('get_pull_requests_by_id', params))
 
 
 def create_pull_request(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     additional_input = params.pop('additional_input', {})
     if additional_input and isinstance(additional_input, dict):
         params.update(additional_input)
@@ -223,17 +1143,23 @@ def create_pull_request(config, params):
     query_param = _build_payload(query_param)
     reviewers = params.get('reviewers')
     reviewers = reviewers.split(',') if isinstance(reviewers, str) and reviewers else reviewers
+    # split the action deadline between the identity lookups, the ref lookups and the create call
     if reviewers:
-        params['reviewers'] = [{"id": get_reviewer_id(config, reviewer.strip()), 'isRequired': True}
-                               for reviewer in reviewers]
-    params['targetRefName'] = get_ref_by_branch_name(config, project, repository, params['targetRefName'])
-    params['sourceRefName'] = get_ref_by_branch_name(config, project, repository, params['sourceRefName'])
+        reviewers = [reviewer.strip() for reviewer in reviewers]
+        with split_deadline(3):
+            reviewer_ids = get_reviewer_ids(config, reviewers, client=client)
+        params['reviewers'] = [{"id": reviewer_ids[reviewer], 'isRequired': True} for reviewer in reviewers]
+    with split_deadline(2):
+        params['targetRefName'] = get_ref_by_branch_name(config, project, repository, params['targetRefName'],
+                                                         client=client)
+        params['sourceRefName'] = get_ref_by_branch_name(config, project, repository, params['sourceRefName'],
+                                                         client=client)
     payload = _build_payload(params)
-    return client.make_request(endpoint, method='POST', params=query_param, data=json.dumps(payload))
+    return client.make_request(endpoint, method='POST', params=query_param, data=json_dumps(payload))
 
 
 def update_pull_request(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     if params.get('additional_input') and isinstance(params.get('additional_input'), dict):
         params.update(params.pop('additional_input', ''))
     project = params.pop('project', '')
@@ -241,31 +1167,33 @@ def update_pull_request(config, params):
     endpoint = "/{0}/_apis/git/repositories/{1}/pullrequests/{2}".format(project, repository,
                                                                          params.pop('pullRequestId', ''))
     params['status'] = PR_STATUS_MAPPING.get(params.get('status'))
-    params['targetRefName'] = get_ref_by_branch_name(config, project, repository, params['targetRefName'])
+    with split_deadline(2):
+        params['targetRefName'] = get_ref_by_branch_name(config, project, repository, params['targetRefName'],
+                                                         client=client)
     payload = _build_payload(params)
-    return client.make_request(endpoint, method='PATCH', data=json.dumps(payload))
+    return client.make_request(endpoint, method='PATCH', data=json_dumps(payload))
 
 
 def list_pull_request_reviewers(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     endpoint = "/{0}/_apis/git/repositories/{1}/pullRequests/{2}/reviewers".format(
         params.pop('project', ''), params.pop('repositoryId', ''), params.pop('pullRequestId', ''))
     return client.make_request(endpoint)
 
 
 def add_pull_request_reviewer(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     endpoint = "/{0}/_apis/git/repositories/{1}/pullRequests/{2}/reviewers".format(
         params.pop('project', ''), params.pop('repositoryId', ''), params.pop('pullRequestId', ''))
     payload = [{
-        'id': get_reviewer_id(config, params.get('reviewerId')),
+        'id': get_reviewer_id(config, params.get('reviewerId'), client=client),
         'isRequired': params.get('isRequired', False)
     }]
-    return client.make_request(endpoint, method='POST', data=json.dumps(payload))
+    return client.make_request(endpoint, method='POST', data=json_dumps(payload))
 
 
 def list_pull_request_commits(config, params):
-    client = AzureDevOps(config)
+    client = get_client(config)
     endpoint = "/{0}/_apis/git/repositories/{1}/pullRequests/{2}/commits?".format(params.pop('project', ''),
                                                                                   params.pop('repositoryId', ''),
                                                                                   params.pop('pullRequestId', ''))
@@ -273,26 +1201,61 @@ def list_pull_request_commits(config, params):
     return client.make_request(endpoint, params=payload)
 
 
-def get_ref_by_branch_name(config, project, repository, branch_name):
+def _index_refs(refs, ref_index=None):
+    ref_index = dict(ref_index or {})
+    for ref in refs:
+        name = ref.get('name', '')
+        ref_index[name] = name
+        if name.startswith(BRANCH_REF_PREFIX):
+            ref_index[name[len(BRANCH_REF_PREFIX):]] = name
+    return ref_index
+
+
+def get_ref_by_branch_name(config, project, repository, branch_name, client=None):
+    if not branch_name:
+        return branch_name
+    cache_key = (config_fingerprint(config), project, repository)
+    ref_index = _ref_cache.get(cache_key)
+    if ref_index is None:
+        # index the refs as they are streamed instead of building the full branch list first
+        client = client or get_client(config)
+        endpoint = "/{0}/_apis/git/repositories/{1}/refs".format(project, repository)
+        ref_index = _index_refs(client.paginate(endpoint, params={"filter": "heads/"}))
+        _ref_cache.set(cache_key, ref_index)
+    if branch_name in ref_index:
+        return ref_index[branch_name]
+    # the branch may have been created after the index was built, look it up and merge it in
     query_params = {
         "project": project,
         "repository": repository,
         "filterContains": branch_name,
-        "limit": 1000
+        "fetch_all": True
     }
-    branches = list_branches(config, query_params).get('value')
-    count = len(branches)
-    if count == 1:
+    branches = list_branches(config, query_params, client=client).get('value')
+    _ref_cache.set(cache_key, _index_refs(branches, ref_index))
+    if len(branches) == 1:
         return branches[0].get('name')
     for branch in branches:
-        if branch.get('name', '') == 'refs/heads/{0}'.format(branch_name):
+        if branch.get('name', '') == '{0}{1}'.format(BRANCH_REF_PREFIX, branch_name):
             return branch.get('name')
     return branch_name
 
 
-def get_reviewer_id(config, query_string):
+def _identity_aliases(identity):
+    properties = identity.get('properties') or {}
+    aliases = [identity.get('providerDisplayName'), identity.get('descriptor'), identity.get('subjectDescriptor'),
+               (properties.get('Mail') or {}).get('$value'), (properties.get('Account') or {}).get('$value')]
+    return [alias for alias in aliases if alias and isinstance(alias, str)]
+
+
+def get_reviewer_id(config, query_string, client=None):
+    namespace = config_fingerprint(config)
+    cache_key = (namespace, str(query_string).lower())
+    cached_id = _identity_cache.get(cache_key)
+    if cached_id is not None:
+        return cached_id or query_string
     try:
-        client = AzureDevOps(config)
+        client = client or get_client(config)
         endpoint = 'https://vssps.dev.azure.com/{0}/_apis/identities'.format(config.get('organization'))
         query_params = {
             'searchFilter': 'General',
@@ -305,13 +1268,17 @@ def get_reviewer_id(config, query_string):
             logger.error("Reviewer {0} not found".format(query_string))
         elif result.get('count') == 1:
             reviewer_id = reviewers[0]['id']
+            for alias in _identity_aliases(reviewers[0]):
+                _identity_cache.set((namespace, alias.lower()), reviewer_id)
         else:
             for reviewer in reviewers:
-                if query_string == reviewers['providerDisplayName']:
+                if query_string == reviewer.get('providerDisplayName'):
                     reviewer_id = reviewer['id']
                     break
         if reviewer_id:
+            _identity_cache.set(cache_key, reviewer_id)
             return reviewer_id
+        _identity_cache.set(cache_key, '', ttl=IDENTITY_NEGATIVE_CACHE_TTL)
         logger.error('Reviewer {0} not found, check if provided reviewer has appropriate permissions.'.format(query_string))
         return query_string
     except Exception as error:
@@ -319,16 +1286,40 @@ def get_reviewer_id(config, query_string):
         return query_string
 
 
+def get_reviewer_ids(config, query_strings, client=None):
+    query_strings = list(dict.fromkeys(query_strings))
+    max_workers = min(get_int_config(config, 'max_concurrency', DEFAULT_MAX_CONCURRENCY), len(query_strings))
+    if max_workers <= 1:
+        return {query_string: get_reviewer_id(config, query_string, client=client) for query_string in query_strings}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        reviewer_ids = executor.map(propagate_action_context(
+            lambda query_string: get_reviewer_id(config, query_string, client=client)), query_strings)
+        return dict(zip(query_strings, reviewer_ids))
+
+
+def invalidate_metadata_cache(config, params):
+    metadata_cache = get_metadata_cache(config)
+    if metadata_cache is None:
+        logger.info('Metadata cache is not enabled, nothing to invalidate')
+        return {'invalidated': 0}
+    catalog = METADATA_CATALOG_MAPPING.get(params.get('catalog') or 'All', params.get('catalog'))
+    count = metadata_cache.invalidate(organization=config.get('organization'), project=params.get('project'),
+                                      catalog=catalog)
+    return {'invalidated': count}
+
+
 operations = {
     'list_pipelines': list_pipelines,
     'list_pipeline_runs': list_pipeline_runs,
     'get_pipeline_run': get_pipeline_run,
     'run_pipeline': run_pipeline,
+    'run_pipelines_bulk': run_pipelines_bulk,
     'list_projects': list_projects,
     'list_repositories': list_repositories,
     'list_branches': list_branches,
     'list_commits': list_commits,
     'get_commit': get_commit,
+    'get_commits_batch': get_commits_batch,
     'list_pull_requests': list_pull_requests,
     'get_pull_requests_by_id': get_pull_requests_by_id,
     'create_pull_request': create_pull_request,
@@ -336,5 +1327,6 @@ operations = {
     'list_pull_request_reviewers': list_pull_request_reviewers,
     'add_pull_request_reviewer': add_pull_request_reviewer,
     'list_pull_request_commits': list_pull_request_commits,
+    'invalidate_metadata_cache': invalidate_metadata_cache,
     'check_health': _check_health
 }
@@ -0,0 +1,87 @@
+"""
+Copyright start
+MIT License
+Copyright (c) 2024 Fortinet Inc
+Copyright end
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from time import time
+from connectors.core.connector import get_logger
+from .constants import *
+from .utils import json_dumps, json_loads
+
+logger = get_logger('azure-devops')
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class PersistentCache:
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, organization TEXT, project TEXT, '
+                         'catalog TEXT, value TEXT, expires_at REAL, accessed_at REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=PERSISTENT_CACHE_LOCK_TIMEOUT)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._lock, self._connect() as conn:
+            row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < time():
+                conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (time(), key))
+            return json_loads(row[0])
+
+    def set(self, key, value, ttl=None, organization='', project='', catalog=''):
+        expires_at = time() + ttl if ttl else None
+        with self._lock, self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (key, organization, project, catalog, json_dumps(value).decode('utf-8'), expires_at,
+                          time()))
+            count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count > self.max_entries:
+                conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)',
+                             (count - self.max_entries,))
+
+    def invalidate(self, organization=None, project=None, catalog=None):
+        conditions, values = [], []
+        for column, value in [('organization', organization), ('project', project), ('catalog', catalog)]:
+            if value:
+                conditions.append('{0} = ?'.format(column))
+                values.append(value)
+        query = 'DELETE FROM cache'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        with self._lock, self._connect() as conn:
+            return conn.execute(query, values).rowcount
+
+
+def get_persistent_cache(path, max_entries):
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = PersistentCache(path, max_entries)
+            _caches[path] = cache
+        return cache
@@ -0,0 +1,21 @@
+"""
+Copyright start
+MIT License
+Copyright (c) 2024 Fortinet Inc
+Copyright end
+"""
+
+import importlib
+import os
+import sys
+import types
+
+
+def load_connector_module(name):
+    # the connector directory name is not a valid package name, so load the package from its path
+    path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if 'azure_devops' not in sys.modules:
+        package = types.ModuleType('azure_devops')
+        package.__path__ = [path]
+        sys.modules['azure_devops'] = package
+    return importlib.import_module('azure_devops.{0}'.format(name))
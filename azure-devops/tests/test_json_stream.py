@@ -0,0 +1,60 @@
+"""
+Copyright start
+MIT License
+Copyright (c) 2024 Fortinet Inc
+Copyright end
+"""
+
+import json
+import pytest
+from .offline import load_connector_module
+
+utils = load_connector_module('utils')
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def assert_streamed_items(body, expected):
+    data = body.encode('utf-8')
+    # every chunk size puts a boundary at every position of the body at least once
+    for size in range(1, len(data) + 1):
+        assert list(utils.iter_json_items(split(data, size))) == expected, 'chunk size {0}'.format(size)
+
+
+@pytest.mark.json_stream
+def test_strings_with_delimiters_and_escapes():
+    body = '{"value": [{"name": "a]b}c", "path": "x\\\\\\"]}"}, "\\"quoted\\" ]", "\\u005d"]}'
+    assert_streamed_items(body, json.loads(body)['value'])
+
+
+@pytest.mark.json_stream
+def test_numbers_and_literals():
+    body = '{"count": 7, "value": [12345, -2.5e10, 0, 3.25, true, null, false, [1, 22], {"n": 987654321}]}'
+    assert_streamed_items(body, json.loads(body)['value'])
+
+
+@pytest.mark.json_stream
+def test_other_arrays_before_value():
+    body = '{"other": [1, [2, {"value": [3]}], "]"], "count": 1, "nested": {"value": [4]}, "value": [{"value": [5]}]}'
+    assert_streamed_items(body, [{'value': [5]}])
+
+
+@pytest.mark.json_stream
+def test_multibyte_characters():
+    body = '{"value": ["héllo", "日本語", "\U0001f600", {"kéy": "ü"}]}'
+    assert_streamed_items(body, json.loads(body)['value'])
+
+
+@pytest.mark.json_stream
+def test_missing_value_key():
+    assert_streamed_items('{"count": 0}', [])
+
+
+@pytest.mark.json_stream
+def test_truncated_body():
+    data = '{"value": [{"id": 1, "name": "a"}, 2500, true, "text"]}'.encode('utf-8')
+    for end in range(len(data)):
+        with pytest.raises(ValueError):
+            list(utils.iter_json_items(split(data[:end], 4)))
@@ -66,6 +66,7 @@ def test_list_pipelines_success(cache, valid_configuration_with_token, connector
         pipelines = result.get('data', {}).get('value')
         if pipelines:
             params_json['run_pipeline'][0]['pipelineId'] = pipelines[0]['id']
+            params_json['run_pipelines_bulk'][0]['pipelines'][0]['pipelineId'] = pipelines[0]['id']
 
 
 @pytest.mark.list_pipelines
@@ -106,6 +107,21 @@ def test_run_pipeline_invalid_stagestoskip(valid_configuration_with_token, conne
     assert result.get('status') == "failed"
 
 
+@pytest.mark.run_pipelines_bulk
+def test_run_pipelines_bulk_success(cache, valid_configuration_with_token, connector_details, params_json):
+    set_report_metadata(connector_details, "Run Pipelines in Bulk", "Verify with valid Input Parameters")
+    for result in run_success_test(cache, connector_details, operation_name='run_pipelines_bulk',
+                                   action_params=params_json['run_pipelines_bulk']):
+        assert result.get('status') == "Success"
+
+
+@pytest.mark.run_pipelines_bulk
+def test_validate_run_pipelines_bulk_output_schema(cache, valid_configuration_with_token, connector_details,
+                                                   info_json, params_json):
+    set_report_metadata(connector_details, "Run Pipelines in Bulk", "Validate Output Schema")
+    run_output_schema_validation(cache, 'run_pipelines_bulk', info_json, params_json['run_pipelines_bulk'])
+
+
 @pytest.mark.list_pipeline_runs
 def test_list_pipeline_runs_success(cache, valid_configuration_with_token, connector_details, params_json):
     set_report_metadata(connector_details, "Get Pipeline Run List", "Verify with valid Input Parameters")
@@ -302,6 +318,22 @@ def test_get_commit_invalid_repositoryid(valid_configuration_with_token, connect
                                     param_type='text', action_params=params_json['get_commit'])
     assert result.get('status') == "failed"
 
+
+@pytest.mark.get_commits_batch
+def test_get_commits_batch_success(cache, valid_configuration_with_token, connector_details, params_json):
+    set_report_metadata(connector_details, "Get Commit Details in Batch", "Verify with valid Input Parameters")
+    for result in run_success_test(cache, connector_details, operation_name='get_commits_batch',
+                                   action_params=params_json['get_commits_batch']):
+        assert result.get('status') == "Success"
+        assert not result.get('data', {}).get('errors')
+
+
+@pytest.mark.get_commits_batch
+def test_validate_get_commits_batch_output_schema(cache, valid_configuration_with_token, connector_details,
+                                                  info_json, params_json):
+    set_report_metadata(connector_details, "Get Commit Details in Batch", "Validate Output Schema")
+    run_output_schema_validation(cache, 'get_commits_batch', info_json, params_json['get_commits_batch'])
+
 ####################################
 ####################################
 ####################################
@@ -690,3 +722,19 @@ def test_run_pipeline_invalid_pipelineid(valid_configuration_with_token, connect
     result = run_invalid_param_test(connector_details, operation_name='run_pipeline', param_name='pipelineId',
                                     param_type='integer', action_params=params_json['run_pipeline'])
     assert result.get('status') == "failed"
+
+
+@pytest.mark.invalidate_metadata_cache
+def test_invalidate_metadata_cache_success(cache, valid_configuration_with_token, connector_details, params_json):
+    set_report_metadata(connector_details, "Invalidate Metadata Cache", "Verify with valid Input Parameters")
+    for result in run_success_test(cache, connector_details, operation_name='invalidate_metadata_cache',
+                                   action_params=params_json['invalidate_metadata_cache']):
+        assert result.get('status') == "Success"
+
+
+@pytest.mark.invalidate_metadata_cache
+def test_validate_invalidate_metadata_cache_output_schema(cache, valid_configuration_with_token, connector_details,
+                                                          info_json, params_json):
+    set_report_metadata(connector_details, "Invalidate Metadata Cache", "Validate Output Schema")
+    run_output_schema_validation(cache, 'invalidate_metadata_cache', info_json,
+                                 params_json['invalidate_metadata_cache'])
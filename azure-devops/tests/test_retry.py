@@ -0,0 +1,107 @@
+"""
+Copyright start
+MIT License
+Copyright (c) 2024 Fortinet Inc
+Copyright end
+"""
+
+import pytest
+import requests
+from connectors.core.connector import ConnectorError
+from .offline import load_connector_module
+
+
+operations = load_connector_module('operations')
+constants = load_connector_module('constants')
+
+
+CONFIG = {
+    'server_url': 'https://dev.azure.com',
+    'organization': 'retry-test',
+    'auth_type': 'Access Token',
+    'api_key': 'api-key',
+    'verify_ssl': True,
+    'rate_limit': 0,
+    'max_retries': 3
+}
+
+
+def make_response(status_code, headers=None, body=b'{"value": []}'):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+@pytest.fixture
+def throttled_client(monkeypatch):
+    """Return a client whose requests are answered from a queue of responses, and the calls and delays it made."""
+    client = operations.AzureDevOps(CONFIG)
+    responses, calls, delays = [], [], []
+
+    def request(method, url, **kwargs):
+        calls.append(method)
+        return responses.pop(0)
+    monkeypatch.setattr(client, 'session', type('Session', (), {'request': staticmethod(request)})())
+    monkeypatch.setattr(operations, 'sleep', delays.append)
+    return client, responses, calls, delays
+
+
+@pytest.mark.retry
+def test_retry_after_header(throttled_client):
+    client, responses, calls, delays = throttled_client
+    responses += [make_response(429, {'Retry-After': '2'}), make_response(200)]
+    assert client.make_request('/_apis/projects') == {'value': []}
+    assert calls == ['GET', 'GET']
+    assert len(delays) == 1 and 2 <= delays[0] <= 2 * (1 + constants.RETRY_JITTER)
+
+
+@pytest.mark.retry
+def test_rate_limit_delay_header(throttled_client):
+    client, responses, calls, delays = throttled_client
+    responses += [make_response(503, {'X-RateLimit-Delay': '1.5'}), make_response(503, {'X-RateLimit-Delay': '3'}),
+                  make_response(200)]
+    assert client.make_request('/_apis/projects') == {'value': []}
+    assert len(calls) == 3
+    assert 1.5 <= delays[0] <= 1.5 * (1 + constants.RETRY_JITTER)
+    assert 3 <= delays[1] <= 3 * (1 + constants.RETRY_JITTER)
+
+
+@pytest.mark.retry
+def test_max_retries(throttled_client):
+    client, responses, calls, delays = throttled_client
+    responses += [make_response(503, {'Retry-After': '0'}) for _ in range(CONFIG['max_retries'] + 1)]
+    with pytest.raises(ConnectorError, match='503'):
+        client.make_request('/_apis/projects')
+    assert len(calls) == CONFIG['max_retries'] + 1
+    assert len(delays) == CONFIG['max_retries']
+
+
+@pytest.mark.retry
+def test_retry_time_budget(throttled_client):
+    client, responses, calls, delays = throttled_client
+    responses += [make_response(429, {'Retry-After': str(constants.RETRY_TIME_BUDGET + 1)}), make_response(200)]
+    with pytest.raises(ConnectorError, match='429'):
+        client.make_request('/_apis/projects')
+    assert calls == ['GET']
+    assert delays == []
+
+
+@pytest.mark.retry
+def test_non_idempotent_method_not_retried(throttled_client):
+    client, responses, calls, delays = throttled_client
+    responses += [make_response(503, {'Retry-After': '1'}), make_response(200)]
+    with pytest.raises(ConnectorError, match='503'):
+        client.make_request('/_apis/pipelines/1/runs', method='POST', data='{}')
+    assert calls == ['POST']
+    assert delays == []
+
+
+@pytest.mark.retry
+def test_non_idempotent_method_retried_when_requested(throttled_client):
+    client, responses, calls, delays = throttled_client
+    responses += [make_response(503, {'Retry-After': '1'}), make_response(200)]
+    assert client.make_request('/_apis/pipelines/1/runs', method='POST', data='{}', retry=True) == {'value': []}
+    assert calls == ['POST', 'POST']
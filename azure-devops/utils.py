@@ -0,0 +1,474 @@
+"""
+Copyright start
+MIT License
+Copyright (c) 2024 Fortinet Inc
+Copyright end
+"""
+
+import codecs
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from time import monotonic, sleep
+import requests
+from requests.adapters import HTTPAdapter
+from connectors.core.connector import get_logger, ConnectorError
+from .constants import *
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+logger = get_logger('azure-devops')
+
+_session_lock = threading.Lock()
+_sessions = {}
+_rate_limiter_lock = threading.Lock()
+_rate_limiters = {}
+_action_deadline = threading.local()
+_action_stats = threading.local()
+_latency_tracker_lock = threading.Lock()
+_latency_trackers = {}
+
+JSON_NUMBER_END = re.compile(r'[\s,\]}]')
+
+
+def config_fingerprint(config, keys=FINGERPRINT_KEYS):
+    values = [str(config.get(key, '')) for key in keys]
+    return hashlib.sha256('|'.join(values).encode('utf-8')).hexdigest()
+
+
+def get_int_config(config, key, default, minimum=1):
+    try:
+        value = int(config.get(key))
+        return value if value >= minimum else default
+    except (TypeError, ValueError):
+        return default
+
+
+def get_timeouts(config):
+    return get_int_config(config, 'connect_timeout', DEFAULT_CONNECT_TIMEOUT), \
+        get_int_config(config, 'read_timeout', DEFAULT_READ_TIMEOUT)
+
+
+def get_deadline():
+    return getattr(_action_deadline, 'value', None)
+
+
+@contextmanager
+def deadline_scope(deadline):
+    previous = get_deadline()
+    if deadline is not None and previous is not None:
+        deadline = min(deadline, previous)
+    _action_deadline.value = deadline if deadline is not None else previous
+    try:
+        yield
+    finally:
+        _action_deadline.value = previous
+
+
+@contextmanager
+def action_deadline(config):
+    timeout = get_int_config(config, 'action_timeout', DEFAULT_ACTION_TIMEOUT, minimum=0)
+    with deadline_scope(monotonic() + timeout if timeout else None):
+        yield
+
+
+@contextmanager
+def split_deadline(parts):
+    """Limit the enclosed calls to an equal share of the remaining deadline, leaving the rest for later steps."""
+    deadline = get_deadline()
+    if deadline is None or parts <= 1:
+        yield
+        return
+    with deadline_scope(monotonic() + max(deadline - monotonic(), 0) / parts):
+        yield
+
+
+class ActionStats:
+    def __init__(self):
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get(self, name):
+        with self._lock:
+            return self.counters.get(name, 0)
+
+
+def get_action_stats():
+    return getattr(_action_stats, 'value', None)
+
+
+def reset_action_stats():
+    _action_stats.value = ActionStats()
+    return _action_stats.value
+
+
+def propagate_action_context(function):
+    """Wrap ``function`` to run under the caller's deadline and action stats when it is executed on a worker thread."""
+    deadline, stats = get_deadline(), get_action_stats()
+
+    def run(*args, **kwargs):
+        previous = get_action_stats()
+        _action_stats.value = stats
+        try:
+            with deadline_scope(deadline):
+                return function(*args, **kwargs)
+        finally:
+            _action_stats.value = previous
+    return run
+
+
+def get_request_timeout(connect_timeout, read_timeout, deadline=None):
+    deadline = get_deadline() if deadline is None else deadline
+    if deadline is None:
+        return connect_timeout, read_timeout
+    remaining = deadline - monotonic()
+    if remaining <= 0:
+        raise ConnectorError('The action did not complete within the configured action timeout')
+    return min(connect_timeout, remaining), min(read_timeout, remaining)
+
+
+def raise_response_error(status_code, content, text, reason):
+    """Raise the ConnectorError for an unsuccessful response, shared by the sync and async clients."""
+    try:
+        error_response = json_loads(content)
+        if error_response.get('message'):
+            error_description = error_response['message']
+            raise ConnectorError({'error_description': error_description})
+        raise ConnectorError(error_response)
+    except Exception as error:
+        logger.warning("error: {0}".format(error))
+        error_response = {
+            "status_code": status_code,
+            "error_message": text if text else reason
+        }
+        raise ConnectorError('Error occurred: {0}'.format(error_response))
+
+
+def get_session(config):
+    # one session per configuration, replaced when its credentials or pool size change
+    key = (str(config.get('server_url', '')).strip('/'), config.get('organization'), config.get('config_id'))
+    pool_size = get_int_config(config, 'pool_size', DEFAULT_POOL_SIZE)
+    settings = (config_fingerprint(config), pool_size)
+    entry = _sessions.get(key)
+    if entry is not None and entry[0] == settings:
+        return entry[1]
+    with _session_lock:
+        entry = _sessions.get(key)
+        if entry is not None and entry[0] == settings:
+            return entry[1]
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        _sessions[key] = (settings, session)
+        if entry is not None:
+            # clients still holding the replaced session open new connections if they use it again
+            entry[1].close()
+        logger.debug('Created pooled HTTP session with pool size {0}'.format(pool_size))
+        return session
+
+
+JSON_CODEC = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+
+
+def json_dumps(value):
+    """Encode ``value`` to UTF-8 JSON bytes with the fastest installed JSON library."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            pass
+    elif ujson is not None:
+        try:
+            return ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+        except (TypeError, OverflowError):
+            pass
+    return json.dumps(value).encode('utf-8')
+
+
+def json_loads(data):
+    """Decode JSON from bytes or str with the fastest installed JSON library."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if ujson is not None:
+        return ujson.loads(data)
+    return json.loads(data)
+
+
+def iter_json_items(chunks, key='value'):
+    """Yield the items of the ``key`` array of a JSON object read from byte chunks, one item at a time."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        if eof:
+            raise ValueError('Unexpected end of JSON response')
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            chunk = text_decoder.decode(b'', final=True)
+        else:
+            chunk = text_decoder.decode(chunk)
+        # drop the consumed part so that only the item being decoded is kept in memory
+        buffer, pos = buffer[pos:] + chunk, 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            fill()
+
+    def decode():
+        nonlocal pos
+        while True:
+            # a number is only complete once it is followed by a delimiter, it may continue in the next chunk
+            if buffer[pos] in '-0123456789' and not eof and not JSON_NUMBER_END.search(buffer, pos):
+                fill()
+                continue
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+
+    if peek() != '{':
+        raise ValueError('Expected a JSON object')
+    pos += 1
+    while True:
+        char = peek()
+        if char == '}':
+            return
+        if char == ',':
+            pos += 1
+            continue
+        name = decode()
+        if peek() != ':':
+            raise ValueError('Expected ":" after "{0}"'.format(name))
+        pos += 1
+        if peek() != '[' or name != key:
+            decode()
+            continue
+        pos += 1
+        while True:
+            char = peek()
+            if char == ']':
+                pos += 1
+                break
+            if char == ',':
+                pos += 1
+                continue
+            yield decode()
+
+
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RateLimiter:
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.min_rate = max(self.max_rate * RATE_LIMIT_MIN_FRACTION, RATE_LIMIT_FLOOR)
+        self.rate = self.max_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self):
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            self.requests += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            self.waited += wait
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            sleep(wait)
+
+    def try_acquire(self):
+        with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.requests += 1
+            return True
+
+    def update(self, response):
+        headers = response.headers
+        with self._lock:
+            self._refill()
+            if response.status_code == 429 or headers.get('X-RateLimit-Delay'):
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate * RATE_LIMIT_DECREASE)
+                return
+            try:
+                limit = float(headers.get('X-RateLimit-Limit'))
+                remaining = float(headers.get('X-RateLimit-Remaining'))
+            except (TypeError, ValueError):
+                limit = remaining = None
+            if limit and remaining / limit < RATE_LIMIT_LOW_WATERMARK:
+                self.rate = max(self.min_rate, self.rate * RATE_LIMIT_SLOWDOWN)
+            else:
+                self.rate = min(self.max_rate, self.rate + RATE_LIMIT_INCREASE)
+
+    def get_state(self):
+        with self._lock:
+            self._refill()
+            return {
+                'rate': round(self.rate, 3),
+                'max_rate': self.max_rate,
+                'tokens': round(self.tokens, 3),
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'waited': round(self.waited, 3)
+            }
+
+
+def get_rate_limiter(config):
+    rate = get_int_config(config, 'rate_limit', DEFAULT_RATE_LIMIT, minimum=0)
+    if not rate:
+        return None
+    key = (str(config.get('server_url', '')).strip('/'), config.get('organization'))
+    with _rate_limiter_lock:
+        rate_limiter = _rate_limiters.get(key)
+        if rate_limiter is None or rate_limiter.max_rate != rate:
+            rate_limiter = RateLimiter(rate, rate * RATE_LIMIT_BURST_FACTOR)
+            _rate_limiters[key] = rate_limiter
+        return rate_limiter
+
+
+def get_rate_limiter_stats():
+    with _rate_limiter_lock:
+        rate_limiters = list(_rate_limiters.items())
+    return {'{0}/{1}'.format(*key): rate_limiter.get_state() for key, rate_limiter in rate_limiters}
+
+
+class LatencyTracker:
+    def __init__(self, window):
+        self.window = window
+        self.requests = 0
+        self.hedges = 0
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, latency):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def percentile(self, key, percentile):
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+            # keep the hedge budget relative to recent traffic
+            if self.requests > HEDGE_BUDGET_WINDOW:
+                self.requests //= 2
+                self.hedges //= 2
+
+    def try_hedge(self, max_ratio):
+        with self._lock:
+            if self.hedges >= self.requests * max_ratio:
+                return False
+            self.hedges += 1
+            return True
+
+    def get_state(self):
+        with self._lock:
+            return {'requests': self.requests, 'hedges': self.hedges, 'endpoints': len(self._samples)}
+
+
+def get_latency_tracker(config):
+    if not config.get('hedge_requests'):
+        return None
+    key = (str(config.get('server_url', '')).strip('/'), config.get('organization'))
+    with _latency_tracker_lock:
+        latency_tracker = _latency_trackers.get(key)
+        if latency_tracker is None:
+            latency_tracker = LatencyTracker(LATENCY_WINDOW)
+            _latency_trackers[key] = latency_tracker
+        return latency_tracker
+
+
+def get_latency_stats():
+    with _latency_tracker_lock:
+        latency_trackers = list(_latency_trackers.items())
+    return {'{0}/{1}'.format(*key): latency_tracker.get_state() for key, latency_tracker in latency_trackers}